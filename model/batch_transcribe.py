@@ -0,0 +1,272 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+#------------- OFFLINE BULK TRANSCRIPTION -------------------
+#
+# Runs the video_process entry points over a directory or a manifest of videos
+# with a pool of worker processes, appending one JSON line per video as soon as
+# it finishes. Videos already present in the output file are skipped, so an
+# interrupted run picks up where it stopped. Paths are stored absolute, and an
+# output file only ever holds results for one set of run options. A video that
+# kills its worker process (OOM, native crash) is recorded as an error, so a
+# rerun does not trip over it again unless --retry_errors is given.
+
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+RUN_OPTION_KEYS = ("mode", "seq_type", "model_type", "hand_mask", "confidence_threshold")
+
+_options = None
+
+
+def list_videos(source):
+    if os.path.isdir(source):
+        videos = []
+        for root, _, files in os.walk(source):
+            for f in files:
+                if f.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.abspath(os.path.join(root, f)))
+        return videos
+
+    # Manifest: one path per line, or JSON lines with a "video" key
+    base_dir = os.path.dirname(os.path.abspath(source))
+    videos = []
+    with open(source, encoding='utf-8') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = json.loads(line)["video"] if line.startswith('{') else line
+            videos.append(os.path.abspath(os.path.join(base_dir, path)))
+    return videos
+
+
+def load_finished(output_path, options, retry_errors):
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+
+    with open(output_path, encoding='utf-8') as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line may be cut short by a crash; that video is simply redone
+                continue
+
+            # Resuming with different options would silently skip videos that were never run with them
+            recorded = {key: record.get(key) for key in RUN_OPTION_KEYS}
+            expected = {key: options.get(key) for key in RUN_OPTION_KEYS}
+            if recorded != expected:
+                raise ValueError(f"{output_path} holds results for {recorded}, not {expected}. "
+                                 f"Use another --output file for these options.")
+
+            if retry_errors and "error" in record:
+                continue
+            finished.add(os.path.abspath(record["video"]))
+    return finished
+
+
+def init_worker(options):
+    global _options
+    _options = options
+    # TensorFlow, MediaPipe and the Cython module are imported once per worker process,
+    # and each .h5 model is loaded on the first video that needs it, then reused
+    import video_process
+    video_process.enable_model_cache()
+
+
+def transcribe(video_path):
+    import cv2
+    import video_process
+
+    mode = _options["mode"]
+    seq_type = _options["seq_type"]
+    model_type = _options["model_type"]
+    hand_mask = _options["hand_mask"]
+
+    cap = cv2.VideoCapture(video_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    record = {
+        "video": video_path,
+        **{key: _options[key] for key in RUN_OPTION_KEYS},
+        "frames": frames,
+    }
+
+    start = time.perf_counter()
+    try:
+        if mode == "complex":
+            if seq_type == "single":
+                record["label"] = video_process.process_video(video_path, model_type, hand_mask=hand_mask)
+            else:
+                record["label"] = video_process.process_video_sequence(video_path, model_type, hand_mask=hand_mask)
+            record["path"] = mode
+        elif mode == "simple":
+            if seq_type == "single":
+                record["label"] = video_process.process_video_eff(video_path, model_type, hand_mask=hand_mask)
+            else:
+                record["label"] = video_process.process_video_sequence_eff(video_path, model_type, hand_mask=hand_mask)
+            record["path"] = mode
+        else:
+            threshold = _options["confidence_threshold"]
+            if threshold is None:
+                threshold = video_process.AUTO_CONFIDENCE_THRESHOLD
+            if seq_type == "single":
+                record["label"], record["path"] = video_process.process_video_auto(
+                    video_path, model_type, confidence_threshold=threshold, hand_mask=hand_mask)
+            else:
+                record["label"], record["path"], record["segment_paths"] = video_process.process_video_sequence_auto(
+                    video_path, model_type, confidence_threshold=threshold, hand_mask=hand_mask)
+    except Exception as e:
+        record["error"] = str(e)
+
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def failed_record(video_path, options, error):
+    # Written by the parent when the worker could not return a record itself
+    return {
+        "video": video_path,
+        **{key: options[key] for key in RUN_OPTION_KEYS},
+        "frames": 0,
+        "error": error,
+        "seconds": 0.0,
+    }
+
+
+def run_pool(videos, workers, options, write_record):
+    # At most `workers` videos are submitted at a time, so when a worker dies the
+    # videos that may have killed it are exactly the ones still in flight.
+    # Returns (in_flight, not_started) when the pool broke, ([], []) otherwise.
+    not_started = list(videos)
+    in_flight = {}
+    broken = False
+
+    # spawn: TensorFlow and MediaPipe state must not be inherited through fork.
+    # ProcessPoolExecutor (unlike Pool) fails with BrokenProcessPool when a worker is
+    # killed instead of waiting forever for the lost task.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker, initargs=(options,)) as pool:
+        while (not_started or in_flight) and not broken:
+            try:
+                while not_started and len(in_flight) < workers:
+                    in_flight[pool.submit(transcribe, not_started[0])] = not_started[0]
+                    not_started.pop(0)
+            except BrokenProcessPool:
+                broken = True
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    continue
+                except Exception as e:
+                    record = failed_record(in_flight[future], options, str(e))
+                del in_flight[future]
+                write_record(record)
+
+    if broken:
+        return list(in_flight.values()), not_started
+    return [], []
+
+
+def run_batch(source, output_path, workers, options, retry_errors=False):
+    videos = list_videos(source)
+    finished = load_finished(output_path, options, retry_errors)
+    pending = [v for v in dict.fromkeys(videos) if v not in finished]
+
+    # Largest first, so long videos do not end up alone at the tail of the run
+    pending.sort(key=lambda v: os.path.getsize(v) if os.path.exists(v) else 0, reverse=True)
+
+    print(f"{len(videos)} videos, {len(videos) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return {"videos": 0, "frames": 0, "errors": 0, "crashed": 0, "seconds": 0.0}
+
+    # A crash can leave a partial last line; start the next record on a fresh line
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, 'rb') as output:
+            output.seek(-1, os.SEEK_END)
+            if output.read(1) != b"\n":
+                with open(output_path, 'a', encoding='utf-8') as fix:
+                    fix.write("\n")
+
+    totals = {"videos": 0, "frames": 0, "errors": 0, "crashed": 0}
+    start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+        def write_record(record):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+
+            totals["videos"] += 1
+            totals["frames"] += record["frames"]
+            if "error" in record:
+                totals["errors"] += 1
+                print(f"[⚠️] {record['video']}: {record['error']}")
+
+            elapsed = time.perf_counter() - start
+            print(f"[{totals['videos']}/{len(pending)}] {record['video']} -> {record.get('label', '')} "
+                  f"({totals['videos'] / elapsed * 60:.1f} videos/min, {totals['frames'] / elapsed:.1f} frames/s)")
+
+        remaining = pending
+        while remaining:
+            suspects, remaining = run_pool(remaining, workers, options, write_record)
+            if suspects:
+                print(f"[⚠️] A worker process died with {len(suspects)} videos in flight; "
+                      f"running them one at a time to find the cause")
+
+            # Every broken pool ends with at least one video recorded, so the run always moves forward
+            for video_path in suspects:
+                if len(suspects) == 1 or run_pool([video_path], 1, options, write_record)[0]:
+                    totals["crashed"] += 1
+                    write_record(failed_record(video_path, options, "Worker process died (out of memory or native crash)"))
+
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe a directory or manifest of sign videos to JSONL.")
+    parser.add_argument("source", help="Directory of videos, or a manifest (one path or JSON object per line)")
+    parser.add_argument("--output", default="transcriptions.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--mode", default="complex", choices=["complex", "simple", "auto"])
+    parser.add_argument("--seq_type", default="single", choices=["single", "sequence"])
+    parser.add_argument("--model_type", type=int, default=3, choices=[1, 2, 3], help="1=letters, 2=numbers, 3=words")
+    parser.add_argument("--hand_mask", default="full", choices=["full", "roi"])
+    parser.add_argument("--confidence_threshold", type=float, default=None, help="auto mode only (default: AUTO_CONFIDENCE_THRESHOLD)")
+    parser.add_argument("--retry_errors", action="store_true", help="Process again videos that failed in a previous run")
+    args = parser.parse_args()
+
+    options = {
+        "mode": args.mode,
+        "seq_type": args.seq_type,
+        "model_type": args.model_type,
+        "hand_mask": args.hand_mask,
+        "confidence_threshold": args.confidence_threshold if args.mode == "auto" else None,
+    }
+
+    try:
+        summary = run_batch(args.source, args.output, args.workers, options, retry_errors=args.retry_errors)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if summary["videos"]:
+        print(f"{summary['videos']} videos ({summary['errors']} errors, {summary['crashed']} killed their worker) "
+              f"in {summary['seconds']:.1f}s: "
+              f"{summary['videos'] / summary['seconds'] * 60:.1f} videos/min, "
+              f"{summary['frames'] / summary['seconds']:.1f} frames/s")
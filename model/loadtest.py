@@ -0,0 +1,409 @@
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+#------------- /predict_video LOAD TEST -------------------
+#
+# Starts server.py locally against stub models that have the same input and
+# output shapes as the real ones, replays the bundled app videos at a given
+# concurrency / arrival rate with a mix of mode, seq_type and model_type, and
+# reports latency percentiles, error rate, throughput and server RSS over time.
+# Everything runs offline: the stubs are Keras models with a fixed top-1
+# confidence per model and EfficientNet is built without downloading the
+# ImageNet weights.
+
+
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+VIDEO_DIR = os.path.join(MODEL_DIR, "..", "flutter app", "assets", "videos")
+
+# Top-1 confidence of the stubs. The eff-only values are per model_type (1, 2, 3): with the default
+# AUTO_CONFIDENCE_THRESHOLD of 0.8, auto answers letters and words from the simple path and escalates numbers.
+STUB_CONFIDENCE = 0.9
+STUB_EFF_CONFIDENCE = {1: 0.95, 2: 0.5, 3: 0.9}
+
+
+
+#------------- STUB MODELS & SERVER -------------------
+
+
+
+def stub_head(layers, n, confidence):
+    # Zero kernel + biased logits: class 0 always wins with exactly `confidence`, whatever the input
+    from tensorflow.keras import initializers
+
+    if not 1.0 / n < confidence < 1.0:
+        raise ValueError(f"Stub confidence must be in ({1.0 / n:.3f}, 1) for {n} classes, got {confidence}")
+    bias = [math.log(confidence * (n - 1) / (1.0 - confidence))] + [0.0] * (n - 1)
+    return layers.Dense(n, activation='softmax', kernel_initializer='zeros',
+                        bias_initializer=initializers.Constant(bias))
+
+
+def build_stub_models(out_dir, confidence=STUB_CONFIDENCE, eff_confidence=STUB_EFF_CONFIDENCE):
+    from tensorflow.keras import layers, Model
+
+    from vid_utils import (
+        FEATURE_SIZE,
+        ZERN_FEATURE_SIZE,
+        max_seq_len,
+        label_map_letters,
+        label_map_numbers,
+        label_map_words
+    )
+    from video_process import MODEL_FILES, EFF_MODEL_FILES
+
+    num_classes = {1: len(label_map_letters), 2: len(label_map_numbers), 3: len(label_map_words)}
+
+    for model_type, n in num_classes.items():
+        # Dual stream: EfficientNet sequence (10, 2560) + Zernike sequence (10, 12, ZERN_FEATURE_SIZE)
+        eff_in = layers.Input(shape=(max_seq_len, 2 * FEATURE_SIZE))
+        zern_in = layers.Input(shape=(max_seq_len, 12, ZERN_FEATURE_SIZE))
+        eff = layers.GlobalAveragePooling1D()(eff_in)
+        zern = layers.GlobalAveragePooling1D()(layers.Reshape((max_seq_len, 12 * ZERN_FEATURE_SIZE))(zern_in))
+        out = stub_head(layers, n, confidence)(layers.Concatenate()([eff, zern]))
+        Model([eff_in, zern_in], out).save(os.path.join(out_dir, MODEL_FILES[model_type]))
+
+        # EfficientNet only: (10, 2560)
+        eff_in = layers.Input(shape=(max_seq_len, 2 * FEATURE_SIZE))
+        out = stub_head(layers, n, eff_confidence[model_type])(layers.GlobalAveragePooling1D()(eff_in))
+        Model(eff_in, out).save(os.path.join(out_dir, EFF_MODEL_FILES[model_type]))
+
+
+def serve_stub(port, confidence, eff_confidence):
+    # Runs inside the server subprocess, with the stub directory as working directory
+    build_stub_models(os.getcwd(), confidence, eff_confidence)
+    from server import app
+    app.run(host="127.0.0.1", port=port, threaded=True, debug=False)
+
+
+def format_eff_confidence(eff_confidence):
+    return ",".join(str(eff_confidence[model_type]) for model_type in sorted(eff_confidence))
+
+
+def parse_eff_confidence(value):
+    values = [float(v) for v in value.split(",")]
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError("Expected three comma-separated values for model types 1, 2, 3")
+    return dict(zip((1, 2, 3), values))
+
+
+def server_log_tail(log_path, lines=20):
+    with open(log_path, errors="replace") as log:
+        return "".join(log.readlines()[-lines:])
+
+
+def start_server(port, work_dir, confidence=STUB_CONFIDENCE, eff_confidence=STUB_EFF_CONFIDENCE, timeout=300):
+    env = dict(os.environ, EFFICIENTNET_WEIGHTS="none", TF_CPP_MIN_LOG_LEVEL="2")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [MODEL_DIR, env.get("PYTHONPATH")]))
+    log_path = os.path.join(work_dir, "server.log")
+    # The child keeps its own copy of the file descriptor
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+             "--stub_confidence", str(confidence), "--stub_eff_confidence", format_eff_confidence(eff_confidence)],
+            cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited during startup:\n{server_log_tail(log_path)}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.5)
+
+    proc.terminate()
+    proc.wait()
+    raise RuntimeError(f"Server not ready after {timeout}s:\n{server_log_tail(log_path)}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+
+#------------- CLIENT -------------------
+
+
+
+def post_video(url, video_path, params, filename):
+    boundary = uuid.uuid4().hex
+    with open(video_path, 'rb') as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; name=\"video\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+    request = urllib.request.Request(
+        f"{url}/predict_video?{urllib.parse.urlencode(params)}", data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        text = e.read().decode(errors="replace")
+        try:
+            return e.code, json.loads(text)
+        except ValueError:
+            return e.code, {"error": text[:200]}
+
+
+def read_rss_mb(pid):
+    # Resident set size of the server process, from /proc (Linux)
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def sample_rss(pid, interval, samples, done_event, start):
+    while not done_event.is_set():
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append((time.perf_counter() - start, rss))
+        done_event.wait(interval)
+
+
+
+#------------- LOAD GENERATION & REPORT -------------------
+
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    # Nearest-rank percentile
+    values = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[k]
+
+
+def run_load(url, videos, requests, concurrency, rate, mix, seed=0, reuse_filenames=False,
+             server_pid=None, rss_interval=1.0):
+    rng = random.Random(seed)
+    plan = []
+    arrival = 0.0
+    for _ in range(requests):
+        if rate > 0:
+            # Open loop: Poisson arrivals at `rate` requests/s, at most `concurrency` in flight
+            arrival += rng.expovariate(rate)
+        plan.append({
+            "video": rng.choice(videos),
+            "params": {
+                "mode": rng.choice(mix["mode"]),
+                "seq_type": rng.choice(mix["seq_type"]),
+                "model_type": rng.choice(mix["model_type"]),
+            },
+            "arrival": arrival,
+        })
+
+    results = []
+    results_lock = threading.Lock()
+    rss_samples = []
+    done_event = threading.Event()
+    start = time.perf_counter()
+
+    def send(item):
+        basename = os.path.basename(item["video"])
+        # Phones upload picker files with unique names; reuse_filenames sends the bare clip name instead
+        filename = basename if reuse_filenames else f"{uuid.uuid4().hex[:8]}_{basename}"
+        sent = time.perf_counter()
+        # Open loop: time spent waiting for a free client slot counts, or saturation would hide in the tail
+        arrived = start + item["arrival"] if rate > 0 else sent
+        try:
+            status, body = post_video(url, item["video"], item["params"], filename)
+            error = body.get("error") if status != 200 else None
+            path = body.get("path")
+            segment_paths = [entry["path"] for entry in body.get("segment_paths", [])]
+        except Exception as e:
+            status, error, path, segment_paths = None, str(e), None, []
+        finished = time.perf_counter()
+
+        with results_lock:
+            results.append({
+                "video": basename,
+                **item["params"],
+                "status": status,
+                "error": error,
+                "path": path,
+                "segment_paths": segment_paths,
+                "arrival": arrived - start,
+                "queue_wait": sent - arrived,
+                "service": finished - sent,
+                "latency": finished - arrived,
+            })
+
+    sampler = None
+    if server_pid is not None:
+        sampler = threading.Thread(target=sample_rss, args=(server_pid, rss_interval, rss_samples, done_event, start))
+        sampler.start()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for item in plan:
+            if rate > 0:
+                time.sleep(max(0.0, start + item["arrival"] - time.perf_counter()))
+            pool.submit(send, item)
+
+    elapsed = time.perf_counter() - start
+    done_event.set()
+    if sampler is not None:
+        sampler.join()
+
+    return results, rss_samples, elapsed
+
+
+def summarize(results, rss_samples, elapsed):
+    def latency_stats(rows):
+        ok = [r for r in rows if r["status"] == 200]
+        stats = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            # Requests by overall path; "mixed" only comes from auto sequence requests
+            "simple_path": sum(1 for r in ok if r["path"] == "simple"),
+            "complex_path": sum(1 for r in ok if r["path"] == "complex"),
+            "mixed_path": sum(1 for r in ok if r["path"] == "mixed"),
+            # Auto sequence segments, counted one by one
+            "simple_segments": sum(r["segment_paths"].count("simple") for r in ok),
+            "complex_segments": sum(r["segment_paths"].count("complex") for r in ok),
+        }
+        for key in ("latency", "queue_wait", "service"):
+            values = [r[key] for r in ok]
+            prefix = "" if key == "latency" else f"{key}_"
+            for p in (50, 95, 99):
+                stats[f"{prefix}p{p}"] = percentile(values, p)
+        return stats
+
+    summary = {
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(results) / elapsed if elapsed else 0.0,
+        "overall": latency_stats(results),
+        "by_request_type": {},
+        "rss_mb": [{"t": t, "rss": rss} for t, rss in rss_samples],
+    }
+    summary["overall"]["error_rate"] = summary["overall"]["errors"] / max(1, len(results))
+
+    keys = sorted({(r["mode"], r["seq_type"], r["model_type"]) for r in results})
+    for mode, seq_type, model_type in keys:
+        rows = [r for r in results if (r["mode"], r["seq_type"], r["model_type"]) == (mode, seq_type, model_type)]
+        summary["by_request_type"][f"{mode}_{seq_type}_{model_type}"] = latency_stats(rows)
+
+    return summary
+
+
+def print_summary(summary):
+    overall = summary["overall"]
+    print(f"{overall['requests']} requests in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['requests_per_second']:.2f} req/s), error rate {overall['error_rate']:.1%}")
+    print(f"latency p50={overall['p50']:.2f}s p95={overall['p95']:.2f}s p99={overall['p99']:.2f}s")
+    print(f"  queue wait p50={overall['queue_wait_p50']:.2f}s p95={overall['queue_wait_p95']:.2f}s "
+          f"p99={overall['queue_wait_p99']:.2f}s")
+    print(f"  service    p50={overall['service_p50']:.2f}s p95={overall['service_p95']:.2f}s "
+          f"p99={overall['service_p99']:.2f}s")
+
+    for key, stats in summary["by_request_type"].items():
+        print(f"  {key:<24} n={stats['requests']:<4} errors={stats['errors']:<3} "
+              f"p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s "
+              f"simple/complex/mixed={stats['simple_path']}/{stats['complex_path']}/{stats['mixed_path']}"
+              + (f" segments simple/complex={stats['simple_segments']}/{stats['complex_segments']}"
+                 if stats['simple_segments'] or stats['complex_segments'] else ""))
+
+    rss = summary["rss_mb"]
+    if rss:
+        print(f"server RSS: start={rss[0]['rss']:.0f}MB max={max(s['rss'] for s in rss):.0f}MB end={rss[-1]['rss']:.0f}MB")
+        step = max(1, len(rss) // 20)
+        for sample in rss[::step]:
+            print(f"  t={sample['t']:7.1f}s  {sample['rss']:.0f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for /predict_video with offline stub models.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrivals per second (0 = closed loop)")
+    parser.add_argument("--modes", default="complex,simple,auto")
+    parser.add_argument("--seq_types", default="single,sequence")
+    parser.add_argument("--model_types", default="1,2,3")
+    parser.add_argument("--videos", default=VIDEO_DIR, help="Directory of .mp4 clips to replay")
+    parser.add_argument("--url", default=None, help="Target an already running server instead of starting one")
+    parser.add_argument("--server_pid", type=int, default=None, help="PID to sample RSS from when --url is used")
+    parser.add_argument("--rss_interval", type=float, default=1.0)
+    parser.add_argument("--reuse_filenames", action="store_true", help="Upload clips under their own name")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the summary and every request to this file")
+    parser.add_argument("--stub_confidence", type=float, default=STUB_CONFIDENCE,
+                        help="Top-1 confidence of the dual-stream stubs")
+    parser.add_argument("--stub_eff_confidence", type=parse_eff_confidence, default=STUB_EFF_CONFIDENCE,
+                        help="Top-1 confidence of the eff-only stubs for model types 1,2,3, e.g. 0.95,0.5,0.9")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_stub(args.port, args.stub_confidence, args.stub_eff_confidence)
+        raise SystemExit(0)
+
+    videos = sorted(glob.glob(os.path.join(args.videos, "*.mp4")))
+    if not videos:
+        raise SystemExit(f"No .mp4 files in {args.videos}")
+
+    mix = {
+        "mode": args.modes.split(","),
+        "seq_type": args.seq_types.split(","),
+        "model_type": [int(m) for m in args.model_types.split(",")],
+    }
+
+    server = None
+    work_dir = None
+    url, server_pid = args.url, args.server_pid
+    try:
+        if url is None:
+            work_dir = tempfile.mkdtemp()
+            port = args.port or free_port()
+            print(f"Starting stub server on port {port}")
+            server = start_server(port, work_dir, args.stub_confidence, args.stub_eff_confidence)
+            url, server_pid = f"http://127.0.0.1:{port}", server.pid
+
+        results, rss_samples, elapsed = run_load(
+            url, videos, args.requests, args.concurrency, args.rate, mix, seed=args.seed,
+            reuse_filenames=args.reuse_filenames, server_pid=server_pid, rss_interval=args.rss_interval
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = summarize(results, rss_samples, elapsed)
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({"summary": summary, "requests": results}, output, ensure_ascii=False, indent=2)
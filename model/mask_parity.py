@@ -0,0 +1,153 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from vid_utils import (
+    extract_frames_from_video,
+    extract_with_landmarks,
+    segment_and_generate_diagrams,
+    process_frame_combined,
+    predict_sequence,
+    predict_sequence_eff,
+    max_seq_len,
+    HAND_MASK_SIZE
+)
+from video_process import load_model_by_type, load_eff_model_by_type
+
+
+#------------- FULL-FRAME vs ROI HAND MASK PARITY -------------------
+
+
+
+def cosine_similarity(a, b):
+    a = np.asarray(a, dtype=np.float64).ravel()
+    b = np.asarray(b, dtype=np.float64).ravel()
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    if norm == 0:
+        return 1.0 if not np.any(a) and not np.any(b) else 0.0
+    return float(np.dot(a, b) / norm)
+
+
+def extract_features(keyframes, base_dir, hand_mask):
+    # Features by keyframe index; failing frames are skipped like in process_video
+    features = {}
+    start = time.perf_counter()
+    for i, frame in enumerate(keyframes):
+        temp_frame_dir = os.path.join(base_dir, f"{hand_mask}_{i}")
+        os.makedirs(temp_frame_dir, exist_ok=True)
+
+        try:
+            segment_and_generate_diagrams(frame, temp_frame_dir, hand_mask)
+            features[i] = process_frame_combined(temp_frame_dir)
+        except Exception as e:
+            print(f"[⚠️] {hand_mask} frame {i} skipped: {e}")
+            continue
+
+    return features, time.perf_counter() - start
+
+
+def check_parity(video_path, model_type, min_similarity=0.9):
+    model = load_model_by_type(model_type)
+    eff_model = load_eff_model_by_type(model_type)
+
+    frame_dir = tempfile.mkdtemp()
+    try:
+        extract_frames_from_video(video_path, frame_dir)
+
+        frames = []
+        frame_files = sorted([f for f in os.listdir(frame_dir) if f.endswith('.jpg')])
+        for frame_file in frame_files:
+            frames.append(cv2.imread(os.path.join(frame_dir, frame_file)))
+
+        important_frames = extract_with_landmarks(frames)
+        if len(important_frames) == 0:
+            raise Exception("No valid frames")
+
+        # Both representations see exactly the same keyframes
+        full, full_time = extract_features(important_frames, frame_dir, "full")
+        roi, roi_time = extract_features(important_frames, frame_dir, "roi")
+
+        # Similarity only over keyframes that survived with both mask types
+        common = sorted(set(full) & set(roi))
+        if len(common) == 0:
+            raise Exception("No keyframe valid with both mask types")
+        eff_similarity = [cosine_similarity(full[i][0], roi[i][0]) for i in common]
+        zern_similarity = [cosine_similarity(full[i][1], roi[i][1]) for i in common]
+
+        # Each mask type predicts from its own surviving keyframes, as production would
+        full_eff = [full[i][0] for i in sorted(full)]
+        full_zern = [full[i][1] for i in sorted(full)]
+        roi_eff = [roi[i][0] for i in sorted(roi)]
+        roi_zern = [roi[i][1] for i in sorted(roi)]
+
+        while len(full_eff) < max_seq_len:
+            full_eff.append(full_eff[-1])
+            full_zern.append(full_zern[-1])
+        while len(roi_eff) < max_seq_len:
+            roi_eff.append(roi_eff[-1])
+            roi_zern.append(roi_zern[-1])
+
+        full_label, full_conf = predict_sequence(model, full_eff, full_zern, model_type)
+        roi_label, roi_conf = predict_sequence(model, roi_eff, roi_zern, model_type)
+        full_label_eff, full_conf_eff = predict_sequence_eff(eff_model, full_eff, model_type)
+        roi_label_eff, roi_conf_eff = predict_sequence_eff(eff_model, roi_eff, model_type)
+
+        frame_height, frame_width = important_frames[0].shape[:2]
+
+        return {
+            "video": video_path,
+            "keyframes": len(important_frames),
+            "full_skipped_frames": len(important_frames) - len(full),
+            "roi_skipped_frames": len(important_frames) - len(roi),
+            "full_mask_shape": [frame_height * 2, frame_width * 2],
+            "roi_mask_shape": [HAND_MASK_SIZE, HAND_MASK_SIZE],
+            "full_seconds": full_time,
+            "roi_seconds": roi_time,
+            "eff_similarity_min": min(eff_similarity),
+            "eff_similarity_mean": float(np.mean(eff_similarity)),
+            "zern_similarity_min": min(zern_similarity),
+            "zern_similarity_mean": float(np.mean(zern_similarity)),
+            "complex": {"full": [full_label, full_conf], "roi": [roi_label, roi_conf]},
+            "simple": {"full": [full_label_eff, full_conf_eff], "roi": [roi_label_eff, roi_conf_eff]},
+            "passed": (
+                full_label == roi_label
+                and full_label_eff == roi_label_eff
+                and min(eff_similarity) >= min_similarity
+                and min(zern_similarity) >= min_similarity
+            ),
+        }
+    finally:
+        shutil.rmtree(frame_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-frame and ROI hand masks on features and predictions.")
+    parser.add_argument("videos", nargs="+", help="Video files to check")
+    parser.add_argument("--model_type", type=int, default=3, help="1=letters, 2=numbers, 3=words")
+    parser.add_argument("--min_similarity", type=float, default=0.9, help="Minimum per-frame cosine similarity")
+    args = parser.parse_args()
+
+    failed = 0
+    for video_path in args.videos:
+        try:
+            report = check_parity(video_path, args.model_type, args.min_similarity)
+        except Exception as e:
+            # One broken video must not stop the remaining ones from being checked
+            print(f"[❌] {video_path}: {e}")
+            failed += 1
+            continue
+        status = "✅" if report["passed"] else "❌"
+        print(f"[{status}] {video_path}")
+        for key, value in report.items():
+            if key not in ("video", "passed"):
+                print(f"    {key}: {value}")
+        if not report["passed"]:
+            failed += 1
+
+    print(f"{len(args.videos) - failed}/{len(args.videos)} videos at parity")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,388 @@
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import cv2
+import mediapipe as mp
+
+from vid_utils import (
+    extract_frames_from_video,
+    is_keyframe,
+    keyframe_indices,
+    reencode_frame,
+    segment_hands_from_results,
+    save_hand_masks,
+    generate_diagrams_from_masks,
+    process_frame_zernike,
+    process_frame_combined_eff,
+    predict_sequence,
+    predict_sequence_eff,
+    max_seq_len
+)
+from video_process import load_model_by_type, load_eff_model_by_type, process_video, process_video_eff
+
+
+#------------- PIPELINED SINGLE-VIDEO EXECUTOR -------------------
+#
+#   decode -> detect -> select keyframes -> geometry -> neural
+#
+# Stages are connected by bounded queues so decoding frame N+1 overlaps hand
+# detection of frame N and size function work on earlier keyframes.
+# Decoding a single video is sequential, so that stage always has one worker.
+# Keyframe selection compares each frame with the previous keyframe, so it
+# runs in one thread that puts the detected frames back in order.
+# Frames are JPEG re-encoded in memory so detection sees the same pixels as the
+# sequential path, which goes through .jpg files; check_executor_parity verifies
+# both executors pick the same keyframes and labels.
+
+
+
+PIPELINE_WORKERS = {"detect": 2, "geometry": 2, "neural": 1}
+PIPELINE_QUEUE_SIZE = 8
+OCCUPANCY_SAMPLE_INTERVAL = 0.01
+
+_DONE = object()
+
+
+def _put(q, item, stop_event):
+    # Bounded put that gives up once the pipeline is stopping, so no stage stays blocked
+    while True:
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            if stop_event.is_set():
+                return False
+
+
+def _close(q, count, consumers):
+    # Sends `count` _DONE markers, unless every consumer is already gone (a stage thread failed)
+    for _ in range(count):
+        while True:
+            try:
+                q.put(_DONE, timeout=0.1)
+                break
+            except queue.Full:
+                if not any(t.is_alive() for t in consumers):
+                    return
+
+
+def _run_stage(name, fn, in_q, out_q, stop_event, stats):
+    # Once stop_event is set the stage only drains its input until it sees _DONE
+    busy = 0.0
+    count = 0
+    while True:
+        item = in_q.get()
+        if item is _DONE:
+            break
+        if stop_event.is_set():
+            continue
+
+        start = time.perf_counter()
+        try:
+            result = fn(item)
+        except Exception as e:
+            print(f"[⚠️] {name} stage skipped item: {e}")
+            result = None
+        busy += time.perf_counter() - start
+        count += 1
+
+        if result is not None and out_q is not None:
+            _put(out_q, result, stop_event)
+
+    with stats["lock"]:
+        stats["stages"][name]["busy_seconds"] += busy
+        stats["stages"][name]["items"] += count
+
+
+def _sample_occupancy(queues, stats, done_event):
+    samples = {name: [] for name in queues}
+    while not done_event.is_set():
+        for name, q in queues.items():
+            samples[name].append(q.qsize())
+        time.sleep(OCCUPANCY_SAMPLE_INTERVAL)
+
+    for name, q in queues.items():
+        values = samples[name] or [0]
+        stats["queues"][name] = {
+            "capacity": q.maxsize,
+            "mean": sum(values) / len(values),
+            "max": max(values),
+            "full_ratio": sum(1 for v in values if v >= q.maxsize) / len(values),
+        }
+
+
+def process_video_pipelined(video_path, model_type, mode="complex", workers=None,
+                            queue_size=PIPELINE_QUEUE_SIZE, hand_mask="full"):
+    if mode not in ("complex", "simple"):
+        raise ValueError("Invalid mode. Use 'complex' or 'simple'.")
+
+    unknown = set(workers or {}) - set(PIPELINE_WORKERS)
+    if unknown:
+        raise ValueError(f"Unknown pipeline stage(s) {sorted(unknown)}. Use {sorted(PIPELINE_WORKERS)}.")
+    workers = dict(PIPELINE_WORKERS, **(workers or {}))
+    for name, count in workers.items():
+        if not isinstance(count, int) or count < 1:
+            raise ValueError(f"Invalid {name} worker count {count!r}. Use an integer >= 1.")
+    if queue_size < 1:
+        raise ValueError(f"Invalid queue_size {queue_size!r}. Use an integer >= 1.")
+
+    model = load_model_by_type(model_type) if mode == "complex" else load_eff_model_by_type(model_type)
+
+    frame_dir = tempfile.mkdtemp()
+    # stop_event: enough keyframes, stop decoding/detecting.
+    # abort_event: a stage thread failed, every stage drains and the error is raised below.
+    stop_event = threading.Event()
+    abort_event = threading.Event()
+    done_event = threading.Event()
+    errors = []
+
+    queues = {
+        "decode": queue.Queue(maxsize=queue_size),
+        "detect": queue.Queue(maxsize=queue_size),
+        "geometry": queue.Queue(maxsize=queue_size),
+        "neural": queue.Queue(maxsize=queue_size),
+    }
+    stats = {
+        "lock": threading.Lock(),
+        "workers": dict(workers, decode=1, select=1),
+        "stages": {name: {"busy_seconds": 0.0, "items": 0}
+                   for name in ("decode", "detect", "select", "geometry", "neural")},
+        "queues": {},
+        "keyframes": [],
+    }
+    eff_by_keyframe, zern_by_keyframe = {}, {}
+    results_lock = threading.Lock()
+
+    # --- Stage 1: decode frames straight into memory ---
+    def decode():
+        start = time.perf_counter()
+        cap = cv2.VideoCapture(video_path)
+        frame_count = 0
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if not _put(queues["decode"], (frame_count, reencode_frame(frame)), stop_event):
+                break
+            frame_count += 1
+        cap.release()
+        stats["stages"]["decode"]["busy_seconds"] = time.perf_counter() - start
+        stats["stages"]["decode"]["items"] = frame_count
+
+    # --- Stage 2: MediaPipe, one Hands object per worker ---
+    def detect_worker():
+        hands = mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=2)
+
+        def detect(item):
+            idx, frame = item
+            results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            return idx, frame, results
+
+        try:
+            _run_stage("detect", detect, queues["decode"], queues["detect"], stop_event, stats)
+        finally:
+            hands.close()
+
+    # --- Keyframe selection, same is_keyframe rule as extract_with_landmarks ---
+    def select():
+        start = time.perf_counter()
+        pending = {}
+        next_idx = 0
+        prev_landmarks = None
+        keyframes = 0
+        finished = 0
+
+        while finished < workers["detect"]:
+            item = queues["detect"].get()
+            if item is _DONE:
+                finished += 1
+                continue
+            if keyframes >= max_seq_len:
+                continue
+
+            pending[item[0]] = item
+            while next_idx in pending and keyframes < max_seq_len:
+                idx, frame, results = pending.pop(next_idx)
+                next_idx += 1
+                if not results.multi_hand_landmarks:
+                    continue
+                landmarks = results.multi_hand_landmarks[0].landmark
+                if is_keyframe(landmarks, prev_landmarks):
+                    _put(queues["geometry"], (keyframes, frame, results), abort_event)
+                    stats["keyframes"].append(idx)
+                    prev_landmarks = landmarks
+                    keyframes += 1
+
+            if keyframes >= max_seq_len:
+                # Enough keyframes: stop decoding and drain what is still in flight
+                stop_event.set()
+                pending.clear()
+
+        stats["stages"]["select"]["busy_seconds"] = time.perf_counter() - start
+        stats["stages"]["select"]["items"] = keyframes
+
+    # --- Stage 3: hand masks, size functions (cy_sf_par) and Zernike ---
+    def geometry(item):
+        k, frame, results = item
+        temp_frame_dir = os.path.join(frame_dir, f"seg_{k}")
+        os.makedirs(temp_frame_dir, exist_ok=True)
+
+        left_img, right_img = segment_hands_from_results(results, frame.shape, hand_mask)
+        save_hand_masks(left_img, right_img, temp_frame_dir)
+        if mode == "complex":
+            generate_diagrams_from_masks(temp_frame_dir)
+            zern_feat = process_frame_zernike(temp_frame_dir)
+            with results_lock:
+                zern_by_keyframe[k] = zern_feat
+        return k, temp_frame_dir
+
+    # --- Stage 4: EfficientNet ---
+    def neural(item):
+        k, temp_frame_dir = item
+        eff_feat = process_frame_combined_eff(temp_frame_dir)
+        with results_lock:
+            eff_by_keyframe[k] = eff_feat
+
+    def guarded(target):
+        # A failing stage thread stops the whole pipeline instead of leaving the others blocked
+        def run(*args):
+            try:
+                target(*args)
+            except Exception as e:
+                errors.append(e)
+                abort_event.set()
+                stop_event.set()
+        return run
+
+    sampler = threading.Thread(target=_sample_occupancy, args=(queues, stats, done_event))
+    decode_thread = threading.Thread(target=guarded(decode))
+    detect_threads = [threading.Thread(target=guarded(detect_worker)) for _ in range(workers["detect"])]
+    select_thread = threading.Thread(target=guarded(select))
+    geometry_threads = [
+        threading.Thread(target=guarded(_run_stage),
+                         args=("geometry", geometry, queues["geometry"], queues["neural"], abort_event, stats))
+        for _ in range(workers["geometry"])
+    ]
+    neural_threads = [
+        threading.Thread(target=guarded(_run_stage),
+                         args=("neural", neural, queues["neural"], None, abort_event, stats))
+        for _ in range(workers["neural"])
+    ]
+
+    start = time.perf_counter()
+    try:
+        for t in [sampler, decode_thread, select_thread] + detect_threads + geometry_threads + neural_threads:
+            t.start()
+
+        # Close each stage once everything upstream of it has finished
+        decode_thread.join()
+        _close(queues["decode"], len(detect_threads), detect_threads)
+        for t in detect_threads:
+            t.join()
+        _close(queues["detect"], len(detect_threads), [select_thread])
+        select_thread.join()
+        _close(queues["geometry"], len(geometry_threads), geometry_threads)
+        for t in geometry_threads:
+            t.join()
+        _close(queues["neural"], len(neural_threads), neural_threads)
+        for t in neural_threads:
+            t.join()
+    finally:
+        done_event.set()
+        sampler.join()
+        shutil.rmtree(frame_dir)
+
+    if errors:
+        raise errors[0]
+
+    stats["total_seconds"] = time.perf_counter() - start
+    del stats["lock"]
+
+    keyframes = sorted(k for k in eff_by_keyframe if mode == "simple" or k in zern_by_keyframe)
+    if len(keyframes) == 0:
+        raise Exception("No valid frames")
+
+    eff_seq = [eff_by_keyframe[k] for k in keyframes]
+    zern_seq = [zern_by_keyframe[k] for k in keyframes] if mode == "complex" else []
+
+    while len(eff_seq) < max_seq_len:
+        eff_seq.append(eff_seq[-1])
+        if mode == "complex":
+            zern_seq.append(zern_seq[-1])
+
+    if mode == "complex":
+        predicted_label, confidence = predict_sequence(model, eff_seq, zern_seq, model_type)
+    else:
+        predicted_label, confidence = predict_sequence_eff(model, eff_seq, model_type)
+
+    return predicted_label, stats
+
+
+def check_executor_parity(video_path, model_type, mode="complex", hand_mask="full", workers=None):
+    # Sequential keyframes as extract_with_landmarks picks them, from the same .jpg frames
+    frame_dir = tempfile.mkdtemp()
+    try:
+        extract_frames_from_video(video_path, frame_dir)
+        frame_files = sorted([f for f in os.listdir(frame_dir) if f.endswith('.jpg')])
+        frames = [cv2.imread(os.path.join(frame_dir, frame_file)) for frame_file in frame_files]
+        sequential_keyframes = keyframe_indices(frames)
+    finally:
+        shutil.rmtree(frame_dir)
+
+    if mode == "complex":
+        sequential_label = process_video(video_path, model_type, hand_mask=hand_mask)
+    else:
+        sequential_label = process_video_eff(video_path, model_type, hand_mask=hand_mask)
+    pipelined_label, stats = process_video_pipelined(video_path, model_type, mode=mode, workers=workers,
+                                                     hand_mask=hand_mask)
+
+    return {
+        "video": video_path,
+        "sequential": {"keyframes": sequential_keyframes, "label": sequential_label},
+        "pipelined": {"keyframes": stats["keyframes"], "label": pipelined_label},
+        "passed": sequential_keyframes == stats["keyframes"] and sequential_label == pipelined_label,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one video through the pipelined executor and report stage/queue usage.")
+    parser.add_argument("video", help="Video file")
+    parser.add_argument("--model_type", type=int, default=3, help="1=letters, 2=numbers, 3=words")
+    parser.add_argument("--mode", default="complex", choices=["complex", "simple"])
+    parser.add_argument("--hand_mask", default="full", choices=["full", "roi"])
+    parser.add_argument("--detect_workers", type=int, default=PIPELINE_WORKERS["detect"])
+    parser.add_argument("--geometry_workers", type=int, default=PIPELINE_WORKERS["geometry"])
+    parser.add_argument("--neural_workers", type=int, default=PIPELINE_WORKERS["neural"])
+    parser.add_argument("--queue_size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--check_parity", action="store_true",
+                        help="Also run the sequential executor and compare keyframes and labels")
+    args = parser.parse_args()
+
+    workers = {"detect": args.detect_workers, "geometry": args.geometry_workers, "neural": args.neural_workers}
+
+    if args.check_parity:
+        report = check_executor_parity(args.video, args.model_type, mode=args.mode, hand_mask=args.hand_mask,
+                                       workers=workers)
+        status = "✅" if report["passed"] else "❌"
+        print(f"[{status}] {args.video}")
+        for executor in ("sequential", "pipelined"):
+            print(f"    {executor}: keyframes={report[executor]['keyframes']} label={report[executor]['label']}")
+        raise SystemExit(0 if report["passed"] else 1)
+
+    label, stats = process_video_pipelined(
+        args.video, args.model_type, mode=args.mode, queue_size=args.queue_size, hand_mask=args.hand_mask,
+        workers=workers
+    )
+
+    print(f"label: {label}")
+    print(f"total: {stats['total_seconds']:.2f}s")
+    for name, stage in stats["stages"].items():
+        print(f"  stage {name:<9} workers={stats['workers'][name]} items={stage['items']} busy={stage['busy_seconds']:.2f}s")
+    for name, occupancy in stats["queues"].items():
+        print(f"  queue {name:<9} capacity={occupancy['capacity']} mean={occupancy['mean']:.2f} "
+              f"max={occupancy['max']} full={occupancy['full_ratio']:.0%}")
@@ -10,8 +10,12 @@ from video_process import (
     process_video,
     process_video_sequence,
     process_video_eff,
-    process_video_sequence_eff
+    process_video_sequence_eff,
+    process_video_auto,
+    process_video_sequence_auto,
+    AUTO_CONFIDENCE_THRESHOLD
 )
+from pipeline import process_video_pipelined
 
 @app.route("/predict_video", methods=["POST"])
 def predict_video():
@@ -23,37 +27,82 @@ def predict_video():
     video.save(filename)
 
     # Get mode and sequence type from query parameters
-    mode = request.args.get('mode', 'complex')       # complex | simple
+    mode = request.args.get('mode', 'complex')       # complex | simple | auto
     seq_type = request.args.get('seq_type', 'single') # single | sequence
     model_type = int(request.args.get('model_type', 3))  # 1=letters, 2=numbers, 3=words
+    confidence_threshold = request.args.get('confidence_threshold', AUTO_CONFIDENCE_THRESHOLD)  # auto mode only, in [0, 1]
+    hand_mask = request.args.get('hand_mask', 'full')  # full | roi
+    executor = request.args.get('executor', 'sequential')  # sequential | pipelined (single complex/simple only)
+    path = mode  # simple | complex | mixed (auto sequence with both paths)
+    segment_paths = None
+    pipeline_stats = None
 
     try:
+        if hand_mask not in ("full", "roi"):
+            return jsonify({"error": "Invalid hand mask"}), 400
+        if executor not in ("sequential", "pipelined"):
+            return jsonify({"error": "Invalid executor"}), 400
+        if executor == "pipelined" and (mode not in ("complex", "simple") or seq_type != "single"):
+            return jsonify({"error": "Pipelined executor only supports single complex/simple requests"}), 400
+        if mode == "auto":
+            try:
+                confidence_threshold = float(confidence_threshold)
+            except ValueError:
+                return jsonify({"error": "Invalid confidence threshold"}), 400
+            if not 0.0 <= confidence_threshold <= 1.0:
+                return jsonify({"error": "Invalid confidence threshold"}), 400
+
         # Complex Mode
         if mode == "complex":
-            if seq_type == "single":
-                result = process_video(filename, model_type=model_type)
+            if seq_type == "single" and executor == "pipelined":
+                result, pipeline_stats = process_video_pipelined(filename, model_type=model_type, mode=mode,
+                                                                 hand_mask=hand_mask)
+            elif seq_type == "single":
+                result = process_video(filename, model_type=model_type, hand_mask=hand_mask)
             elif seq_type == "sequence":
-                result = process_video_sequence(filename, model_type=model_type)
+                result = process_video_sequence(filename, model_type=model_type, hand_mask=hand_mask)
             else:
                 return jsonify({"error": "Invalid sequence type"}), 400
 
         # Simple Mode
         elif mode == "simple":
+            if seq_type == "single" and executor == "pipelined":
+                result, pipeline_stats = process_video_pipelined(filename, model_type=model_type, mode=mode,
+                                                                 hand_mask=hand_mask)
+            elif seq_type == "single":
+                result = process_video_eff(filename, model_type=model_type, hand_mask=hand_mask)
+            elif seq_type == "sequence":
+                result = process_video_sequence_eff(filename, model_type=model_type, hand_mask=hand_mask)
+            else:
+                return jsonify({"error": "Invalid sequence type"}), 400
+
+        # Auto Mode: simple first, complex only when the simple model is unsure
+        elif mode == "auto":
             if seq_type == "single":
-                result = process_video_eff(filename, model_type=model_type)
+                result, path = process_video_auto(filename, model_type=model_type,
+                                                  confidence_threshold=confidence_threshold,
+                                                  hand_mask=hand_mask)
             elif seq_type == "sequence":
-                result = process_video_sequence_eff(filename, model_type=model_type)
+                result, path, segment_paths = process_video_sequence_auto(filename, model_type=model_type,
+                                                                          confidence_threshold=confidence_threshold,
+                                                                          hand_mask=hand_mask)
             else:
                 return jsonify({"error": "Invalid sequence type"}), 400
 
         else:
             return jsonify({"error": "Invalid mode"}), 400
 
-        return jsonify({
+        response = {
             "mode": f"{mode}_{seq_type}",
             "model_type": model_type,
+            "path": path,
             "label": result
-        })
+        }
+        if segment_paths is not None:
+            response["segment_paths"] = segment_paths
+        if pipeline_stats is not None:
+            response["pipeline"] = pipeline_stats
+        return jsonify(response)
 
     except Exception as e:
         return jsonify({
@@ -25,7 +25,11 @@ import cy_sf_par
 #----------- FEATURE EXTRACTION ------------------------
 
 
-base_model = EfficientNetB0(include_top=False, input_shape=(224, 224, 3), pooling='avg')
+# 'imagenet' downloads the weights on first use; the offline load test runs with EFFICIENTNET_WEIGHTS=none
+EFFICIENTNET_WEIGHTS = os.environ.get('EFFICIENTNET_WEIGHTS', 'imagenet')
+
+base_model = EfficientNetB0(include_top=False, input_shape=(224, 224, 3), pooling='avg',
+                            weights=None if EFFICIENTNET_WEIGHTS == 'none' else EFFICIENTNET_WEIGHTS)
 eff_model = Model(inputs=base_model.input, outputs=base_model.output)
 FEATURE_SIZE = base_model.output_shape[-1]  
 
@@ -140,6 +144,30 @@ def process_frame_combined_eff(frame_dir):
     return combined_eff
 
 
+def process_frame_zernike(frame_dir):
+    # Zernike features only, for frames whose EfficientNet features are already known
+    left_zern = [np.zeros(ZERN_FEATURE_SIZE)] * 6
+    right_zern = [np.zeros(ZERN_FEATURE_SIZE)] * 6
+
+    # --- Process Left Hand ---
+    results_dir = os.path.join(frame_dir, 'left_hand', 'results')
+    if os.path.exists(results_dir):
+        diagram_files = sorted([f for f in os.listdir(results_dir) if f.startswith('results-') and f.endswith('.png')])[:6]
+        left_zern = [extract_zernike_features(os.path.join(results_dir, f)) for f in diagram_files]
+        left_zern += [np.zeros(ZERN_FEATURE_SIZE)] * (6 - len(left_zern))
+
+    # --- Process Right Hand ---
+    results_dir = os.path.join(frame_dir, 'right_hand', 'results')
+    if os.path.exists(results_dir):
+        diagram_files = sorted([f for f in os.listdir(results_dir) if f.startswith('results-') and f.endswith('.png')])[:6]
+        right_zern = [extract_zernike_features(os.path.join(results_dir, f)) for f in diagram_files]
+        right_zern += [np.zeros(ZERN_FEATURE_SIZE)] * (6 - len(right_zern))
+
+    # Zernike features: shape (12, ZERN_FEATURE_SIZE)
+    combined_zern = np.array(left_zern + right_zern)
+    return combined_zern
+
+
 
 
 # ---------------- Hand landmark extraction ------------------------
@@ -156,15 +184,24 @@ def get_hand_landmarks(frame):
 def distance_landmarks(l1, l2):
     return np.linalg.norm(np.array([[lm.x, lm.y] for lm in l1]) - np.array([[lm.x, lm.y] for lm in l2]))
 
-def extract_with_landmarks(segment):
-    important_frames = []
+# Minimum landmark distance from the previous keyframe for a frame to become a keyframe
+KEYFRAME_DISTANCE_THRESHOLD = 0.05
+
+def is_keyframe(landmarks, prev_landmarks):
+    return prev_landmarks is None or distance_landmarks(landmarks, prev_landmarks) > KEYFRAME_DISTANCE_THRESHOLD
+
+def keyframe_indices(segment):
+    indices = []
     prev_landmarks = None
-    for frame in segment:
+    for i, frame in enumerate(segment):
         landmarks = get_hand_landmarks(frame)
-        if landmarks and (prev_landmarks is None or distance_landmarks(landmarks, prev_landmarks) > 0.05):
-            important_frames.append(frame)
+        if landmarks and is_keyframe(landmarks, prev_landmarks):
+            indices.append(i)
             prev_landmarks = landmarks
-    return important_frames[:10]
+    return indices[:max_seq_len]
+
+def extract_with_landmarks(segment):
+    return [segment[i] for i in keyframe_indices(segment)]
 
 
 
@@ -174,54 +211,83 @@ def extract_with_landmarks(segment):
 mp_hands = mp.solutions.hands
 hands = mp_hands.Hands(static_image_mode=True, max_num_hands=2)
 
-def segment_hands_from_frame(frame):
+# Compact representation: crop to the landmark bounding box and render directly at a fixed size
+HAND_MASK_SIZE = 400
+HAND_MASK_PADDING = 0.15
+
+def hand_points_from_landmarks(hand_landmarks, frame_shape):
+    return np.array([[lm.x * frame_shape[1], lm.y * frame_shape[0]] for lm in hand_landmarks.landmark], dtype=np.float64)
+
+def render_full_hand_mask(polylines, frame_shape):
+    mask = np.zeros((frame_shape[0], frame_shape[1]), dtype=np.uint8)
+    for points in polylines:
+        points = points.astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(mask, [points], isClosed=True, color=255, thickness=1)
+    return cv2.resize(mask, (0, 0), fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
+
+def render_roi_hand_mask(polylines):
+    mask = np.zeros((HAND_MASK_SIZE, HAND_MASK_SIZE), dtype=np.uint8)
+    if not polylines:
+        return mask
+
+    all_points = np.vstack(polylines)
+    top_left = all_points.min(axis=0)
+    extent = all_points.max(axis=0) - top_left
+
+    # Square box around the hand so the aspect ratio is kept, centred in the canvas
+    side = max(extent.max(), 1.0) * (1.0 + 2.0 * HAND_MASK_PADDING)
+    scale = (HAND_MASK_SIZE - 1) / side
+    offset = (HAND_MASK_SIZE - 1 - extent * scale) / 2.0
+
+    for points in polylines:
+        points = np.round((points - top_left) * scale + offset).astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(mask, [points], isClosed=True, color=255, thickness=1)
+    return mask
+
+def render_hand_mask(polylines, frame_shape, hand_mask="full"):
+    if hand_mask == "full":
+        return render_full_hand_mask(polylines, frame_shape)
+    elif hand_mask == "roi":
+        return render_roi_hand_mask(polylines)
+    else:
+        raise ValueError("Invalid hand_mask. Use 'full' or 'roi'.")
+
+def segment_hands_from_frame(frame, hand_mask="full"):
     img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     results = hands.process(img_rgb)
+    return segment_hands_from_results(results, frame.shape, hand_mask)
 
-    left_mask = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
-    right_mask = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
+def segment_hands_from_results(results, frame_shape, hand_mask="full"):
+    # Same as segment_hands_from_frame, for callers that already ran MediaPipe on the frame
+    left_polylines, right_polylines = [], []
 
     if results.multi_hand_landmarks and results.multi_handedness:
         for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
             label = handedness.classification[0].label
-            points = []
-            for lm in hand_landmarks.landmark:
-                x = int(lm.x * frame.shape[1])
-                y = int(lm.y * frame.shape[0])
-                points.append([x, y])
-
-            points = np.array(points, np.int32).reshape((-1, 1, 2))
+            points = hand_points_from_landmarks(hand_landmarks, frame_shape)
             if label == 'Left':
-                cv2.polylines(left_mask, [points], isClosed=True, color=255, thickness=1)
+                left_polylines.append(points)
             elif label == 'Right':
-                cv2.polylines(right_mask, [points], isClosed=True, color=255, thickness=1)
+                right_polylines.append(points)
 
-    left_mask_resized = cv2.resize(left_mask, (0, 0), fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
-    right_mask_resized = cv2.resize(right_mask, (0, 0), fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
+    left_mask = render_hand_mask(left_polylines, frame_shape, hand_mask)
+    right_mask = render_hand_mask(right_polylines, frame_shape, hand_mask)
 
-    return left_mask_resized, right_mask_resized
+    return left_mask, right_mask
 
-def segment_hands_from_frame_eff(frame, output_dir):
+def segment_hands_from_frame_eff(frame, output_dir, hand_mask="full"):
     img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     results = hands.process(img_rgb)
 
     if results.multi_hand_landmarks and results.multi_handedness:
         for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
             label = handedness.classification[0].label
-            points = []
-            for lm in hand_landmarks.landmark:
-                x = int(lm.x * frame.shape[1])
-                y = int(lm.y * frame.shape[0])
-                points.append([x, y])
-
-            points = np.array(points, np.int32).reshape((-1, 1, 2))
-            mask = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
-            cv2.polylines(mask, [points], isClosed=True, color=255, thickness=1)
-            mask_resized = cv2.resize(mask, (0, 0), fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
+            points = hand_points_from_landmarks(hand_landmarks, frame.shape)
+            mask = render_hand_mask([points], frame.shape, hand_mask)
 
             hand_dir = os.path.join(output_dir, f'{label.lower()}_hand')
             os.makedirs(hand_dir, exist_ok=True)
-            cv2.imwrite(os.path.join(hand_dir, f'{label.lower()}_hand.png'), mask_resized)
+            cv2.imwrite(os.path.join(hand_dir, f'{label.lower()}_hand.png'), mask)
 
 
 
@@ -229,23 +295,34 @@ def segment_hands_from_frame_eff(frame, output_dir):
 
 
 
-def segment_and_generate_diagrams(frame, output_dir):
-    left_img, right_img = segment_hands_from_frame(frame)
-    sf = cy_sf_par.SizeFunction()
+def segment_and_generate_diagrams(frame, output_dir, hand_mask="full"):
+    left_img, right_img = segment_hands_from_frame(frame, hand_mask)
+    save_hand_masks(left_img, right_img, output_dir)
+    generate_diagrams_from_masks(output_dir)
+
 
+def save_hand_masks(left_img, right_img, output_dir):
     if np.any(left_img):
         left_dir = os.path.join(output_dir, 'left_hand')
-        os.makedirs(os.path.join(left_dir, 'results'), exist_ok=True)
-        left_path = os.path.join(left_dir, 'left_hand.png')
-        cv2.imwrite(left_path, left_img)
-        sf.mainn(imagefile=left_path, ang=200, result_path=os.path.join(left_dir, 'results'))
+        os.makedirs(left_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(left_dir, 'left_hand.png'), left_img)
 
     if np.any(right_img):
         right_dir = os.path.join(output_dir, 'right_hand')
-        os.makedirs(os.path.join(right_dir, 'results'), exist_ok=True)
-        right_path = os.path.join(right_dir, 'right_hand.png')
-        cv2.imwrite(right_path, right_img)
-        sf.mainn(imagefile=right_path, ang=200, result_path=os.path.join(right_dir, 'results'))
+        os.makedirs(right_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(right_dir, 'right_hand.png'), right_img)
+
+
+def generate_diagrams_from_masks(frame_dir):
+    # Size function diagrams for hand masks already on disk (save_hand_masks or segment_hands_from_frame_eff)
+    sf = cy_sf_par.SizeFunction()
+
+    for hand in ('left_hand', 'right_hand'):
+        hand_dir = os.path.join(frame_dir, hand)
+        hand_path = os.path.join(hand_dir, f'{hand}.png')
+        if os.path.exists(hand_path):
+            os.makedirs(os.path.join(hand_dir, 'results'), exist_ok=True)
+            sf.mainn(imagefile=hand_path, ang=200, result_path=os.path.join(hand_dir, 'results'))
         
         
         
@@ -393,3 +470,8 @@ def extract_frames_from_video(video_path, output_folder):
     
     cap.release()
     return saved_count
+
+def reencode_frame(frame):
+    # Same pixels as a frame written by extract_frames_from_video and read back with cv2.imread
+    _, buffer = cv2.imencode('.jpg', frame)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
@@ -15,33 +15,59 @@ from vid_utils import (
     segment_hands_from_frame_eff,
     process_frame_combined_eff,
     predict_sequence_eff,
+    generate_diagrams_from_masks,
+    process_frame_zernike,
     max_seq_len
 )
 
 
 
 
+# Top-1 confidence of the eff-only model below which mode=auto escalates to the dual-stream model
+AUTO_CONFIDENCE_THRESHOLD = 0.8
+
+
 #------------- LOAD MODELS --------------------------
 
 
 
+MODEL_FILES = {
+    1: "model_dual_stream_letters_frames10_zern8.h5",
+    2: "model_dual_stream_numbers_frames10_zern8.h5",
+    3: "model_dual_stream_50_words_10_frames_zern8.h5",
+}
+
+EFF_MODEL_FILES = {
+    1: "model_eff_only_letters_10_frames_zern8.h5",
+    2: "model_eff_only_numbers_10_frames_zern8.h5",
+    3: "model_eff_only_words_50_frames_10_zern8.h5",
+}
+
+# Loaded models by file, only kept once a process opts in with enable_model_cache()
+_model_cache = None
+
+def enable_model_cache():
+    # For single-threaded worker processes that run many videos (batch_transcribe)
+    global _model_cache
+    if _model_cache is None:
+        _model_cache = {}
+
+def load_model_file(path):
+    if _model_cache is None:
+        return load_model(path)
+    if path not in _model_cache:
+        _model_cache[path] = load_model(path)
+    return _model_cache[path]
+
 def load_model_by_type(model_type):
-    if model_type == 1:
-        return load_model("model_dual_stream_letters_frames10_zern8.h5")
-    elif model_type == 2:
-        return load_model("model_dual_stream_numbers_frames10_zern8.h5")
-    elif model_type == 3:
-        return load_model("model_dual_stream_50_words_10_frames_zern8.h5")
+    if model_type in MODEL_FILES:
+        return load_model_file(MODEL_FILES[model_type])
     else:
         raise ValueError("Invalid model_type. Use 1 (letters), 2 (numbers), or 3 (words).")
 
 def load_eff_model_by_type(model_type):
-    if model_type == 1:
-        return load_model("model_eff_only_letters_10_frames_zern8.h5")
-    elif model_type == 2:
-        return load_model("model_eff_only_numbers_10_frames_zern8.h5")
-    elif model_type == 3:
-        return load_model("model_eff_only_words_50_frames_10_zern8.h5")
+    if model_type in EFF_MODEL_FILES:
+        return load_model_file(EFF_MODEL_FILES[model_type])
     else:
         raise ValueError("Invalid model_type. Use 1 (letters), 2 (numbers), or 3 (words).")
 
@@ -50,7 +76,7 @@ def load_eff_model_by_type(model_type):
 #------------- EFF & ZERNIKE FEATURES ----------------
 
 
-def process_video(video_path, model_type):
+def process_video(video_path, model_type, hand_mask="full"):
     model = load_model_by_type(model_type)
 
     frame_dir = tempfile.mkdtemp()
@@ -71,7 +97,7 @@ def process_video(video_path, model_type):
         os.makedirs(temp_frame_dir, exist_ok=True)
 
         try:
-            segment_and_generate_diagrams(frame, temp_frame_dir)
+            segment_and_generate_diagrams(frame, temp_frame_dir, hand_mask)
             eff_feat, zern_feat = process_frame_combined(temp_frame_dir)
             eff_seq.append(eff_feat)
             zern_seq.append(zern_feat)
@@ -93,7 +119,7 @@ def process_video(video_path, model_type):
 
 
 
-def process_video_sequence(video_path, model_type):
+def process_video_sequence(video_path, model_type, hand_mask="full"):
     model = load_model_by_type(model_type)
     WINDOW_SIZE = 10
     CONFIDENCE_THRESHOLD = 0.7
@@ -138,7 +164,7 @@ def process_video_sequence(video_path, model_type):
             os.makedirs(frame_dir, exist_ok=True)
 
             try:
-                segment_and_generate_diagrams(frame, frame_dir)
+                segment_and_generate_diagrams(frame, frame_dir, hand_mask)
                 eff_feat, zern_feat = process_frame_combined(frame_dir)
                 eff_seq.append(eff_feat)
                 zern_seq.append(zern_feat)
@@ -175,7 +201,7 @@ def process_video_sequence(video_path, model_type):
 
 
 
-def process_video_eff(video_path, model_type):
+def process_video_eff(video_path, model_type, hand_mask="full"):
     model = load_eff_model_by_type(model_type)
 
     frame_dir = tempfile.mkdtemp()
@@ -196,7 +222,7 @@ def process_video_eff(video_path, model_type):
         os.makedirs(temp_frame_dir, exist_ok=True)
 
         try:
-            segment_hands_from_frame_eff(frame, frame_dir)
+            segment_hands_from_frame_eff(frame, frame_dir, hand_mask)
             eff_feat = process_frame_combined_eff(frame_dir)
             eff_seq.append(eff_feat)
         except Exception as e:
@@ -217,7 +243,7 @@ def process_video_eff(video_path, model_type):
 
 
 
-def process_video_sequence_eff(video_path, model_type):
+def process_video_sequence_eff(video_path, model_type, hand_mask="full"):
     model = load_eff_model_by_type(model_type)
     WINDOW_SIZE = 10
     CONFIDENCE_THRESHOLD = 0.7
@@ -262,7 +288,7 @@ def process_video_sequence_eff(video_path, model_type):
             os.makedirs(frame_dir, exist_ok=True)
 
             try:
-                segment_hands_from_frame_eff(frame, frame_dir)
+                segment_hands_from_frame_eff(frame, frame_dir, hand_mask)
                 eff_feat = process_frame_combined_eff(frame_dir)
                 eff_seq.append(eff_feat)
             except Exception as e:
@@ -288,3 +314,177 @@ def process_video_sequence_eff(video_path, model_type):
     sentence = " ".join([pred["label"] for pred in final_predictions])
     shutil.rmtree(temp_dir)
     return sentence
+
+
+
+
+
+#-------------- AUTO: EFF FIRST, ESCALATE TO EFF & ZERNIKE -------------------
+
+
+
+def extract_eff_keyframes(keyframes, base_dir, hand_mask="full"):
+    # Each keyframe keeps its own directory so the hand masks can be reused on escalation
+    eff_seq, frame_dirs = [], []
+    for i, frame in enumerate(keyframes):
+        temp_frame_dir = os.path.join(base_dir, f"seg_{i}")
+        os.makedirs(temp_frame_dir, exist_ok=True)
+
+        try:
+            segment_hands_from_frame_eff(frame, temp_frame_dir, hand_mask)
+            eff_feat = process_frame_combined_eff(temp_frame_dir)
+            eff_seq.append(eff_feat)
+            frame_dirs.append(temp_frame_dir)
+        except Exception as e:
+            print(f"[⚠️] Frame {i} skipped: {e}")
+            continue
+
+    return eff_seq, frame_dirs
+
+
+def escalate_with_zernike(eff_seq, frame_dirs):
+    # Adds the Zernike stream on top of already computed EfficientNet features
+    dual_eff_seq, zern_seq = [], []
+    for eff_feat, temp_frame_dir in zip(eff_seq, frame_dirs):
+        try:
+            generate_diagrams_from_masks(temp_frame_dir)
+            zern_feat = process_frame_zernike(temp_frame_dir)
+            dual_eff_seq.append(eff_feat)
+            zern_seq.append(zern_feat)
+        except Exception as e:
+            print(f"[⚠️] Frame {temp_frame_dir} skipped: {e}")
+            continue
+
+    return dual_eff_seq, zern_seq
+
+
+def cascade_predict(eff_model, get_dual_model, eff_seq, frame_dirs, model_type, window_size, confidence_threshold):
+    padded_eff_seq = list(eff_seq)
+    while len(padded_eff_seq) < window_size:
+        padded_eff_seq.append(padded_eff_seq[-1])
+
+    label, confidence = predict_sequence_eff(eff_model, padded_eff_seq, model_type)
+    if confidence >= confidence_threshold:
+        return label, confidence, "simple"
+
+    dual_eff_seq, zern_seq = escalate_with_zernike(eff_seq, frame_dirs)
+    if len(dual_eff_seq) == 0:
+        return label, confidence, "simple"
+
+    while len(dual_eff_seq) < window_size:
+        dual_eff_seq.append(dual_eff_seq[-1])
+        zern_seq.append(zern_seq[-1])
+
+    label, confidence = predict_sequence(get_dual_model(), dual_eff_seq, zern_seq, model_type)
+    return label, confidence, "complex"
+
+
+def summarize_paths(segment_paths):
+    # "simple" or "complex" when every segment took that path, "mixed" otherwise.
+    # A video without any predicted segment never escalated, so it counts as "simple".
+    paths = {entry["path"] for entry in segment_paths}
+    if len(paths) > 1:
+        return "mixed"
+    return paths.pop() if paths else "simple"
+
+
+def process_video_auto(video_path, model_type, confidence_threshold=AUTO_CONFIDENCE_THRESHOLD, hand_mask="full"):
+    eff_model = load_eff_model_by_type(model_type)
+
+    frame_dir = tempfile.mkdtemp()
+    extract_frames_from_video(video_path, frame_dir)
+
+    frames = []
+    frame_files = sorted([f for f in os.listdir(frame_dir) if f.endswith('.jpg')])
+    for frame_file in frame_files:
+        frame_path = os.path.join(frame_dir, frame_file)
+        frame = cv2.imread(frame_path)
+        frames.append(frame)
+
+    important_frames = extract_with_landmarks(frames)
+
+    eff_seq, frame_dirs = extract_eff_keyframes(important_frames, frame_dir, hand_mask)
+
+    if len(eff_seq) == 0:
+        shutil.rmtree(frame_dir)
+        raise Exception("No valid frames")
+
+    predicted_label, confidence, path = cascade_predict(
+        eff_model, lambda: load_model_by_type(model_type),
+        eff_seq, frame_dirs, model_type, max_seq_len, confidence_threshold
+    )
+    shutil.rmtree(frame_dir)
+    return predicted_label, path
+
+
+
+
+def process_video_sequence_auto(video_path, model_type, confidence_threshold=AUTO_CONFIDENCE_THRESHOLD, hand_mask="full"):
+    eff_model = load_eff_model_by_type(model_type)
+    dual_model = None
+    WINDOW_SIZE = 10
+    CONFIDENCE_THRESHOLD = 0.7
+    MOTION_THRESHOLD = 2.0
+
+    temp_dir = tempfile.mkdtemp()
+    extract_frames_from_video(video_path, temp_dir)
+
+    frames = []
+    frame_files = sorted([f for f in os.listdir(temp_dir) if f.endswith('.jpg')])
+    for frame_file in frame_files:
+        frame_path = os.path.join(temp_dir, frame_file)
+        frame = cv2.imread(frame_path)
+        frames.append(frame)
+
+    gesture_starts = detect_gesture_starts_optical_flow(temp_dir, MOTION_THRESHOLD)
+    gesture_starts.append(len(frames))
+
+    segments = []
+    for i in range(len(gesture_starts) - 1):
+        start = gesture_starts[i]
+        end = gesture_starts[i + 1]
+        segment = frames[start:end]
+        if segment:
+            segments.append(segment)
+
+    # The dual-stream model is only loaded once a segment actually escalates
+    def get_dual_model():
+        nonlocal dual_model
+        if dual_model is None:
+            dual_model = load_model_by_type(model_type)
+        return dual_model
+
+    final_predictions = []
+    segment_paths = []
+    last_label = None
+
+    for seg_idx, segment in enumerate(segments):
+        segment = extract_with_landmarks(segment)
+        if not segment:
+            continue
+
+        seg_dir = os.path.join(temp_dir, f"segment_{seg_idx}")
+        os.makedirs(seg_dir, exist_ok=True)
+
+        eff_seq, frame_dirs = extract_eff_keyframes(segment, seg_dir, hand_mask)
+
+        if len(eff_seq) == 0:
+            continue
+
+        label, confidence, path = cascade_predict(
+            eff_model, get_dual_model, eff_seq, frame_dirs, model_type, WINDOW_SIZE, confidence_threshold
+        )
+        # Every predicted segment is reported, including the ones dropped by CONFIDENCE_THRESHOLD below
+        segment_paths.append({"segment": seg_idx, "path": path})
+
+        if confidence >= CONFIDENCE_THRESHOLD and label != last_label:
+            final_predictions.append({
+                "segment": seg_idx,
+                "label": label,
+                "confidence": float(confidence)
+            })
+            last_label = label
+
+    sentence = " ".join([pred["label"] for pred in final_predictions])
+    shutil.rmtree(temp_dir)
+    return sentence, summarize_paths(segment_paths), segment_paths